@@ -15,11 +15,15 @@
 # You should have received a copy of the GNU General Public License along with
 # this program; if not, see <https://www.gnu.org/licenses/>.
 
+import hashlib
+import os
+import time
 from typing import Any, Dict
 
 from sphinx.application import Sphinx
 from sphinx.config import Config
 
+from sphinxcontrib.citations import core
 from sphinxcontrib.citations.core import write_citing_bibtex
 
 
@@ -51,15 +55,58 @@ def produce_bibtex(_, config: Config):
     if config["citations_ads_token"] is None:
         raise RuntimeError("citations_ads_token not set")
 
+    core.set_max_retries(config["citations_max_retries"])
+
     if config["citations_bibtex_file"] is not None:
         # We act only if we have a destination bibtex file where to write
 
+        bibtex_file = config["citations_bibtex_file"]
+        bibcode_list = config["citations_bibcode_list"]
+        bibcode_list = (
+            [bibcode_list]
+            if isinstance(bibcode_list, str)
+            else list(bibcode_list)
+        )
+
+        # We fingerprint the inputs of the fetch and save the fingerprint next
+        # to the bibtex file. When neither the bibcode list nor the token
+        # changed since the last build, the output would be the same, so we
+        # can skip talking to ADS altogether.
+        hash_file = f"{bibtex_file}.hash"
+        config_hash = hashlib.sha256(
+            repr(
+                (sorted(bibcode_list), config["citations_ads_token"])
+            ).encode()
+        ).hexdigest()
+
+        force_refresh = config["citations_force_refresh"]
+        cache_ttl_days = config["citations_cache_ttl_days"]
+
+        if force_refresh:
+            # The user wants fresh data: drop what is memoized in this process
+            # and ignore all the caches below
+            core.clear_cached_bibtex()
+        elif os.path.exists(bibtex_file) and os.path.exists(hash_file):
+            # The fingerprint only lets us skip the fetch while it is younger
+            # than the cache time-to-live: new citing papers accumulate over
+            # time, so an unchanged configuration does not mean that the
+            # output would be unchanged too
+            age_days = (time.time() - os.path.getmtime(hash_file)) / 86400
+            if age_days < cache_ttl_days:
+                with open(hash_file, "r") as file_:
+                    if file_.read() == config_hash:
+                        return
+
         write_citing_bibtex(
             config["citations_ads_token"],
-            config["citations_bibcode_list"],
-            config["citations_bibtex_file"],
+            bibcode_list,
+            bibtex_file,
+            cache_ttl_days=0 if force_refresh else cache_ttl_days,
         )
 
+        with open(hash_file, "w") as file_:
+            file_.write(config_hash)
+
 
 def setup(app: Sphinx) -> Dict[str, Any]:
 
@@ -70,6 +117,13 @@ def setup(app: Sphinx) -> Dict[str, Any]:
     app.add_config_value(
         "citations_bibtex_file", "sphinxcontrib_citations.bib", "html"
     )
+    app.add_config_value(
+        "citations_cache_ttl_days", core.DEFAULT_CACHE_TTL_DAYS, "html"
+    )
+    app.add_config_value(
+        "citations_max_retries", core.DEFAULT_MAX_RETRIES, "html"
+    )
+    app.add_config_value("citations_force_refresh", False, "html")
 
     # We produce the bibtex files very early on (in the "config-initiated"
     # phase), so that we can assume that they are ready for the compilation
@@ -18,21 +18,230 @@
 """Fetch list of citing papers from ADS and produce a bibtex file.
 """
 
+import concurrent.futures
+import functools
+import hashlib
 import json
-import re
-from typing import Iterable, Set, Union
-from urllib.parse import urlencode
+import os
+import time
+from typing import Any, Callable, Iterable, Iterator, Set, Tuple, Union
+from urllib.parse import quote_plus
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
+# orjson decodes the multi-KB JSON responses sent by ADS considerably faster
+# than the standard library. It is entirely optional (it is provided as the
+# orjson extra): when it is not installed, we transparently fall back to the
+# json module.
+try:
+    import orjson  # type: ignore
 
+    def _json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+except ImportError:
+
+    def _json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+# How many times a failed request to ADS is retried before giving up. Users
+# can change this with the citations_max_retries configuration value.
+DEFAULT_MAX_RETRIES = 5
+
+
+def _make_adapter(max_retries: int) -> HTTPAdapter:
+    """Return a pooled HTTP adapter that retries transient ADS failures.
+
+    Retried status codes are rate limiting (429) and server errors (5xx).
+    Attempts back off exponentially, and the Retry-After header sent by ADS
+    when throttling is honored.
+
+    :param max_retries: How many times a failed request is retried.
+
+    :returns: Adapter to be mounted on a :py:class:`requests.Session`.
+
+    """
+    return HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=max_retries,
+            backoff_factor=1.0,
+            status_forcelist=[429, 500, 502, 503, 504],
+            # By default only idempotent verbs are retried, which would leave
+            # out the export POST in get_bibtex. That request only reads data
+            # and is safe to repeat, so we retry every method.
+            allowed_methods=None,
+            respect_retry_after_header=True,
+        ),
+    )
+
+
+# We reuse a single session (and hence its pool of connections) for all the
+# calls to ADS, so that the TCP + TLS handshake is paid only once instead of
+# once per request. The mounted adapter also transparently retries transient
+# failures, so a hiccup on the ADS side does not kill the entire build.
+_SESSION = requests.Session()
+_SESSION.mount("https://", _make_adapter(DEFAULT_MAX_RETRIES))
+
+
+def set_max_retries(max_retries: int) -> None:
+    """Change how many times failed requests to ADS are retried.
+
+    :param max_retries: How many times a failed request is retried.
+
+    """
+    _SESSION.mount("https://", _make_adapter(max_retries))
+
+
+# Maximum number of queries that we send to ADS at the same time. ADS enforces
+# rate limits, so we should not fire an unbounded number of connections.
+MAX_CONCURRENT_QUERIES = 10
+
+# Base URL of the ADS API
+_API_URL = "https://api.adsabs.harvard.edu/v1/"
+
+# Maximum number of results that ADS returns for a single query. When more
+# results are available, we page through them with the start= parameter.
+MAX_ROWS = 2000
+
+# The fl and rows parameters of search queries never change, so we bake them
+# into this template once instead of running urlencode on every request; only
+# the variable parts (start and the query itself) still need escaping.
+_SEARCH_URL = f"{_API_URL}search/query?fl=bibcode&rows={MAX_ROWS}&start="
+
+# How many bibcodes we put in a single export request. One huge export is
+# slower than a few medium-sized ones issued in parallel, because the chunks
+# overlap network transfer with server-side processing.
+EXPORT_CHUNK_SIZE = 500
+
+# Where we store the responses of previous ADS queries, so that rebuilding the
+# documentation does not hit the network (and the ADS daily quota) again.
+_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "sphinxcontrib-citations"
+)
+
+# For how many days a cached ADS response is considered valid. Users can
+# change this with the citations_cache_ttl_days configuration value.
+DEFAULT_CACHE_TTL_DAYS = 7
+
+
+def _cached_on_disk(query_type: str) -> Callable:
+    """Cache the result of an ADS query on disk.
+
+    This is a decorator factory for functions with signature
+    ``func(token, bibcodes)``. The result is saved as JSON in a file under
+    ``_CACHE_DIR`` whose name is a hash of the token, the (sorted) bibcodes,
+    and ``query_type``. When the decorated function is called again with the
+    same arguments and the file is younger than ``cache_ttl_days`` days, the
+    cached result is returned and no network request is performed.
+
+    :param query_type: Identifier of the query (e.g. ``citations``), so that
+                       different functions called with the same bibcodes do
+                       not collide.
+
+    :returns: Decorator that adds on-disk caching to the given function.
+
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(
+            token: str,
+            bibcodes: Union[str, Iterable[str]],
+            cache_ttl_days: float = DEFAULT_CACHE_TTL_DAYS,
+        ):
+            # Normalize the bibcodes so that equivalent calls (e.g. the same
+            # bibcodes in a different order) map onto the same cache file
+            bibcodes = (
+                (bibcodes,) if isinstance(bibcodes, str) else tuple(bibcodes)
+            )
+            key = hashlib.sha256(
+                repr(
+                    (token, tuple(sorted(set(bibcodes))), query_type)
+                ).encode()
+            ).hexdigest()
+            cache_file = os.path.join(_CACHE_DIR, f"{key}.json")
+
+            if os.path.exists(cache_file):
+                age_days = (time.time() - os.path.getmtime(cache_file)) / 86400
+                if age_days < cache_ttl_days:
+                    with open(cache_file, "r") as file_:
+                        cached = json.load(file_)
+                    # Sets are stored as sorted lists (JSON has no sets)
+                    return set(cached) if isinstance(cached, list) else cached
+
+            result = func(token, bibcodes)
+
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            # We write to a temporary file and rename it, so that interrupted
+            # builds never leave a truncated cache entry behind
+            tmp_file = f"{cache_file}.tmp"
+            with open(tmp_file, "w") as file_:
+                json.dump(
+                    sorted(result) if isinstance(result, set) else result,
+                    file_,
+                )
+            os.replace(tmp_file, cache_file)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _fetch_citing_page(
+    token: str, query: str, start: int
+) -> Tuple[int, Iterator[str]]:
+    """Fetch one page of bibcodes matching the given ADS query.
+
+    :param token: ADSABS API key.
+    :param query: ADS query (e.g. ``citations(bibcode:XXX)``).
+    :param start: Index of the first result in the page.
+
+    :returns: Total number of results for the query, and an iterator over the
+              bibcodes in the requested page.
+
+    """
+    full_query = f"{_SEARCH_URL}{start}&q={quote_plus(query)}"
+    req = _SESSION.get(
+        full_query,
+        headers={
+            "Authorization": "Bearer " + token,
+            "Content-type": "application/json",
+        },
+    )
+    if not req.ok:
+        raise RuntimeError(f"Request failed ({req.reason})")
+
+    response = _json_loads(req.content)["response"]
+
+    # We hand out a generator (rather than building a list) so that the caller
+    # can feed the bibcodes straight into a set without an intermediate copy
+    return response["numFound"], (doc["bibcode"] for doc in response["docs"])
+
+
+@_cached_on_disk("citations")
 def get_citing_bibcodes(
     token: str, bibcodes: Union[str, Iterable[str]]
 ) -> Set[str]:
     """Return a set of all the bibcodes that cite the given ones.
 
-    This function performs one API call per bibcode. It requires an active
-    internet connection.
+    This function performs a single API call for all the bibcodes (plus one
+    per additional page, when there are more than ``MAX_ROWS`` results; the
+    extra pages are fetched concurrently). Responses are cached on disk, so
+    repeated calls within the cache time-to-live do not require an internet
+    connection.
 
     :param token: ADSABS API key.
     :param bibcodes: Bibcode(s) for which the citing papers have to be found.
@@ -40,50 +249,70 @@ def get_citing_bibcodes(
     :returns: Bibcodes of papers that cite the given bibcode(s)
 
     """
-    _API_URL = "https://api.adsabs.harvard.edu/v1/"
+    # Ensure that we are working with an iterable. Duplicated bibcodes would
+    # only repeat work, so we drop them, and we sort so that the query we send
+    # (and hence any cache keyed on it) is deterministic
+    bibcodes = (
+        (bibcodes,)
+        if isinstance(bibcodes, str)
+        else tuple(sorted(set(bibcodes)))
+    )
 
-    # We have to ask for a maximum number of results for any given query. We
-    # set this to a reasonably high value. If more results are needed, we
-    # should implement pagination, but we will worry about this only if needed.
-    MAX_ROWS = 2000
+    # ADS supports boolean OR in queries, so instead of asking for the
+    # citations of each bibcode separately we fold everything into one request
+    joined = " OR ".join(f"bibcode:{bibcode}" for bibcode in bibcodes)
+    query = f"citations({joined})"
 
-    # Ensure that we are working with an iterable
-    bibcodes = (bibcodes,) if isinstance(bibcodes, str) else bibcodes
+    num_found, page = _fetch_citing_page(token, query, 0)
 
     # We will collect all the results in the ret_bibcodes set
-    ret_bibcodes = set()
-
-    for bibcode in bibcodes:
-        query = f"citations(bibcode:{bibcode})"
-        encoded_query = urlencode({"q": query, "fl": "bibcode"})
-        full_query = f"{_API_URL}search/query?{encoded_query}&rows={MAX_ROWS}"
-        req = requests.get(
-            full_query,
-            headers={
-                "Authorization": "Bearer " + token,
-                "Content-type": "application/json",
-            },
-        )
-        if not req.ok:
-            raise RuntimeError(f"Request failed ({req.reason})")
+    ret_bibcodes = set(page)
+
+    if num_found > MAX_ROWS:
+        # There are more pages. They are independent from one another and pure
+        # I/O, so we fetch them in parallel and merge the results as they come
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_QUERIES
+        ) as executor:
+            for _, page in executor.map(
+                lambda start: _fetch_citing_page(token, query, start),
+                range(MAX_ROWS, num_found, MAX_ROWS),
+            ):
+                ret_bibcodes.update(page)
 
-        req_json = req.json()
+    return ret_bibcodes
 
-        if req_json["response"]["numFound"] > MAX_ROWS:
-            # See https://github.com/adsabs/adsabs-dev-api/blob/master/examples/search_and_export.ipynb
-            raise NotImplementedError()
 
-        docs = req_json["response"]["docs"]
+def _fetch_bibtex_chunk(token: str, bibcodes: Tuple[str, ...]) -> str:
+    """Export the bibtex for one chunk of bibcodes.
 
-        ret_bibcodes.update([doc["bibcode"] for doc in docs])
+    :param token: ADSABS API key.
+    :param bibcodes: Bibcodes for the desired resources.
 
-    return ret_bibcodes
+    :returns: Bibtex retrieved for the given bibcodes.
+
+    """
+    req = _SESSION.post(
+        f"{_API_URL}export/bibtex",
+        headers={
+            "Authorization": "Bearer " + token,
+            "Content-type": "application/json",
+        },
+        data=_json_dumps({"bibcode": list(bibcodes)}),
+    )
+    if not req.ok:
+        raise RuntimeError(f"Request failed ({req.reason})")
 
+    return _json_loads(req.content)["export"]
 
+
+@_cached_on_disk("export")
 def get_bibtex(token: str, bibcodes: Union[str, Iterable[str]]) -> str:
     """Return a bibtex associated to the given bibcode(s).
 
-    This function performs a API call. It requires an active internet
+    This function performs one API call per ``EXPORT_CHUNK_SIZE`` bibcodes;
+    the calls are issued concurrently. Responses are cached on disk, so
+    repeated calls within the cache time-to-live do not require an internet
     connection.
 
     :param token: ADSABS API key.
@@ -96,34 +325,154 @@ def get_bibtex(token: str, bibcodes: Union[str, Iterable[str]]) -> str:
     # Ensure that we are working with a tuple
     bibcodes = (bibcodes,) if isinstance(bibcodes, str) else tuple(bibcodes)
 
-    payload = {"bibcode": bibcodes}
+    chunks = []
+    for start in range(0, len(bibcodes), EXPORT_CHUNK_SIZE):
+        stop = start + EXPORT_CHUNK_SIZE
+        chunks.append(bibcodes[start:stop])
+
+    # The exports are independent from one another and pure I/O, so we issue
+    # them in parallel and stitch the results back together in order
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_QUERIES
+    ) as executor:
+        return "\n".join(
+            executor.map(
+                lambda chunk: _fetch_bibtex_chunk(token, chunk), chunks
+            )
+        )
 
-    req = requests.post(
-        "https://api.adsabs.harvard.edu/v1/export/bibtex",
-        headers={
-            "Authorization": "Bearer " + token,
-            "Content-type": "application/json",
-        },
-        data=json.dumps(payload),
+
+@functools.lru_cache(maxsize=16)
+def _memoized_citing_bibtex(
+    token: str, bibcodes: Tuple[str, ...], cache_ttl_days: float
+) -> str:
+    """Memoized implementation of :py:func:`~.get_citing_bibtex`.
+
+    The arguments have to be hashable, so ``bibcodes`` must already be a
+    (normalized) tuple here.
+
+    """
+    citing = get_citing_bibcodes(
+        token, bibcodes, cache_ttl_days=cache_ttl_days
     )
-    if not req.ok:
-        raise RuntimeError("Request failed ({req.reason})")
 
-    return req.json()["export"]
+    return get_bibtex(
+        token, tuple(sorted(citing)), cache_ttl_days=cache_ttl_days
+    )
 
 
-def get_citing_bibtex(token: str, bibcodes: Union[str, Iterable[str]]) -> str:
+def get_citing_bibtex(
+    token: str,
+    bibcodes: Union[str, Iterable[str]],
+    cache_ttl_days: float = DEFAULT_CACHE_TTL_DAYS,
+) -> str:
     """Return a bibtex for all the papers citing the given bibcodes.
 
+    The result is memoized, so calling this function multiple times with the
+    same arguments within one process (e.g. with sphinx-autobuild, where
+    config-inited fires on every reload) performs the work only once. Use
+    :py:func:`~.clear_cached_bibtex` to force a fresh fetch.
+
     :param token: ADSABS API key.
     :param bibcodes: Bibcode(s) for which the citing papers have to be found.
+    :param cache_ttl_days: For how many days cached ADS responses are valid.
 
     :returns: Bibtex(s) retrieved for papers citing the given bibcode(s).
 
     """
-    bibcodes = get_citing_bibcodes(token, bibcodes)
+    # lru_cache needs hashable arguments, so we normalize the bibcodes to a
+    # sorted tuple (which also makes equivalent calls share one cache entry)
+    bibcodes = (
+        (bibcodes,)
+        if isinstance(bibcodes, str)
+        else tuple(sorted(set(bibcodes)))
+    )
+
+    return _memoized_citing_bibtex(token, bibcodes, cache_ttl_days)
+
 
-    return get_bibtex(token, bibcodes)
+def clear_cached_bibtex() -> None:
+    """Forget the bibtex memoized for the current process.
+
+    The next call to :py:func:`~.get_citing_bibtex` will query ADS (or the
+    on-disk cache) again.
+
+    """
+    _memoized_citing_bibtex.cache_clear()
+
+
+# The bibtex produced by ADS contains macros for journal names that need to be
+# defined to be able to compile the file. For example, we will have lines that
+# look like: `journal = {\prd},`
+# What we want to do here is substitute \prd with whatever ADS deems the
+# correct name. The substitution list is:
+_SUBS = {
+    r"\aj": "AJ",
+    r"\actaa": "Acta Astron.",
+    r"\araa": r"ARA\&A",
+    r"\apj": "ApJ",
+    r"\apjl": "ApJ",
+    r"\apjlett": "ApJ",
+    r"\apjs": "ApJS",
+    r"\apjsupp": "ApJS",
+    r"\ao": "Appl.~Opt.",
+    r"\applopt": "Appl.~Opt.",
+    r"\apss": r"Ap\&SS",
+    r"\aap": r"A\&A",
+    r"\astap": r"A\&A",
+    r"\aapr": r"A\&A~Rev.",
+    r"\aaps": r"A\&AS",
+    r"\azh": "AZh",
+    r"\baas": "BAAS",
+    r"\bac": "Bull. astr. Inst. Czechosl.",
+    r"\caa": "Chinese Astron. Astrophys.",
+    r"\cjaa": "Chinese J. Astron. Astrophys",
+    r"\icarus": "Icarus",
+    r"\jcap": "J. Cosmology Astropart. Phys.",
+    r"\jrasc": "JRASC",
+    r"\memras": "MmRAS",
+    r"\mnras": "MNRAS",
+    r"\na": "New A",
+    r"\nar": "New A Rev.",
+    r"\pra": "Phys.~Rev.~A",
+    r"\prb": "Phys.~Rev.~B",
+    r"\prc": "Phys.~Rev.~C",
+    r"\prd": "Phys.~Rev.~D",
+    r"\pre": "Phys.~Rev.~E",
+    r"\prl": "Phys.~Rev.~Lett.",
+    r"\pasa": "PASA",
+    r"\pasp": "PASP",
+    r"\pasj": "PASJ",
+    r"\rmxaa": "Rev. Mexicana Astron. Astrofis.",
+    r"\qjras": "QJRAS",
+    r"\skytel": r"S\&T",
+    r"\solphys": "Sol.~Phys.",
+    r"\sovast": "Soviet~Ast.",
+    r"\ssr": "Space~Sci.~Rev.",
+    r"\zap": "ZAp",
+    r"\nat": "Nature",
+    r"\iaucirc": "IAU~Circ.",
+    r"\aplett": "Astrophys.~Lett.",
+    r"\apspr": "Astrophys.~Space~Phys.~Res.",
+    r"\bain": "Bull.~Astron.~Inst.~Netherlands",
+    r"\fcp": "Fund.~Cosmic~Phys.",
+    r"\gca": "Geochim.~Cosmochim.~Acta",
+    r"\grl": "Geophys.~Res.~Lett.",
+    r"\jcp": "J.~Chem.~Phys.",
+    r"\jgr": "J.~Geophys.~Res.",
+    r"\jqsrt": "J.~Quant.~Spec.~Radiat.~Transf.",
+    r"\memsai": "Mem.~Soc.~Astron.~Italiana",
+    r"\nphysa": "Nucl.~Phys.~A",
+    r"\physrep": "Phys.~Rep.",
+    r"\physscr": "Phys.~Scr",
+    r"\planss": "Planet.~Space~Sci.",
+    r"\procspie": "Proc.~SPIE",
+}
+
+# The scanner in expand_journal_abbreviations extracts macro names without
+# their backslash, so we index the substitutions that way once at import time
+# instead of gluing the backslash back on at every match.
+_SUBS_BY_NAME = {key[1:]: value for key, value in _SUBS.items()}
 
 
 def expand_journal_abbreviations(bibtex: str) -> str:
@@ -141,95 +490,42 @@ def expand_journal_abbreviations(bibtex: str) -> str:
     :returns: Same as input, but with abbreviations expanded.
 
     """
-
-    # The bibtex now will contain macros for journal names that need to be
-    # defined to be able to compile the file. For example, we will have lines
-    # that look like: `journal = {\prd},`
-    # What we want to do here is substitute \prd with whatever ADS deems the
-    # correct name. The substitution list is:
-    subs = {
-        r"\aj": "AJ",
-        r"\actaa": "Acta Astron.",
-        r"\araa": r"ARA\&A",
-        r"\apj": "ApJ",
-        r"\apjl": "ApJ",
-        r"\apjlett": "ApJ",
-        r"\apjs": "ApJS",
-        r"\apjsupp": "ApJS",
-        r"\ao": "Appl.~Opt.",
-        r"\applopt": "Appl.~Opt.",
-        r"\apss": r"Ap\&SS",
-        r"\aap": r"A\&A",
-        r"\astap": r"A\&A",
-        r"\aapr": r"A\&A~Rev.",
-        r"\aaps": r"A\&AS",
-        r"\azh": "AZh",
-        r"\baas": "BAAS",
-        r"\bac": "Bull. astr. Inst. Czechosl.",
-        r"\caa": "Chinese Astron. Astrophys.",
-        r"\cjaa": "Chinese J. Astron. Astrophys",
-        r"\icarus": "Icarus",
-        r"\jcap": "J. Cosmology Astropart. Phys.",
-        r"\jrasc": "JRASC",
-        r"\memras": "MmRAS",
-        r"\mnras": "MNRAS",
-        r"\na": "New A",
-        r"\nar": "New A Rev.",
-        r"\pra": "Phys.~Rev.~A",
-        r"\prb": "Phys.~Rev.~B",
-        r"\prc": "Phys.~Rev.~C",
-        r"\prd": "Phys.~Rev.~D",
-        r"\pre": "Phys.~Rev.~E",
-        r"\prl": "Phys.~Rev.~Lett.",
-        r"\pasa": "PASA",
-        r"\pasp": "PASP",
-        r"\pasj": "PASJ",
-        r"\rmxaa": "Rev. Mexicana Astron. Astrofis.",
-        r"\qjras": "QJRAS",
-        r"\skytel": r"S\&T",
-        r"\solphys": "Sol.~Phys.",
-        r"\sovast": "Soviet~Ast.",
-        r"\ssr": "Space~Sci.~Rev.",
-        r"\zap": "ZAp",
-        r"\nat": "Nature",
-        r"\iaucirc": "IAU~Circ.",
-        r"\aplett": "Astrophys.~Lett.",
-        r"\apspr": "Astrophys.~Space~Phys.~Res.",
-        r"\bain": "Bull.~Astron.~Inst.~Netherlands",
-        r"\fcp": "Fund.~Cosmic~Phys.",
-        r"\gca": "Geochim.~Cosmochim.~Acta",
-        r"\grl": "Geophys.~Res.~Lett.",
-        r"\jcp": "J.~Chem.~Phys.",
-        r"\jgr": "J.~Geophys.~Res.",
-        r"\jqsrt": "J.~Quant.~Spec.~Radiat.~Transf.",
-        r"\memsai": "Mem.~Soc.~Astron.~Italiana",
-        r"\nphysa": "Nucl.~Phys.~A",
-        r"\physrep": "Phys.~Rep.",
-        r"\physscr": "Phys.~Scr",
-        r"\planss": "Planet.~Space~Sci.",
-        r"\procspie": "Proc.~SPIE",
-    }
-
-    # Now we match anything that looks like `{\XXXXXXX}`, and substitute the
-    # content. In this, we a lookaround regex here to avoid removing the { }
-    #
-    # Let's unpack (?<={)\\(\w+)(?=}): https://stackoverflow.com/a/2973495
-    # 1. (?<={) and (?=}) are the bounding lookaround groups
-    # 2. Inside, we match \\(\w+), which matches the literal \\ and a word
-    #
-    # re.sub matches the pattern in the first argument and applies the
-    # substitution defined in the second argument to the string in the last
-    # argument
-    def _expand(abbr: str) -> str:
-        # If we don't have the abbreviation in the dictionary, just return what
-        # we had with removing the \
-        return subs.get(abbr, abbr.replace("\\", ""))
-
-    return re.sub(r"(?<={)\\(\w+)(?=})", lambda m: _expand(m.group(0)), bibtex)
+    # The journal macros always look like `{\XXXXXXX}`, which is restricted
+    # enough that a single pass with str.find beats a regular expression: all
+    # the work (searching, slicing, joining) happens in C loops, with no
+    # state-machine overhead per character
+    out = []
+    pos = 0
+    while True:
+        start = bibtex.find("{\\", pos)
+        if start < 0:
+            # No more macros: copy the rest verbatim
+            out.append(bibtex[pos:])
+            break
+        end = bibtex.find("}", start)
+        name_start = start + 2
+        if end < 0 or not bibtex[name_start:end].isalpha():
+            # Not a journal macro (e.g. `{\&}` or an unterminated brace):
+            # copy up to and including the opening brace and keep scanning
+            # right after it
+            after_brace = start + 1
+            out.append(bibtex[pos:after_brace])
+            pos = after_brace
+            continue
+        name = bibtex[name_start:end]
+        out.append(bibtex[pos:start])
+        # Unknown abbreviations are expanded by just dropping the backslash
+        out.append("{" + _SUBS_BY_NAME.get(name, name) + "}")
+        pos = end + 1
+
+    return "".join(out)
 
 
 def write_citing_bibtex(
-    token: str, bibcodes: Union[str, Iterable[str]], path: str
+    token: str,
+    bibcodes: Union[str, Iterable[str]],
+    path: str,
+    cache_ttl_days: float = DEFAULT_CACHE_TTL_DAYS,
 ) -> None:
     """Write a bibtex for all the papers citing the given bibcodes.
 
@@ -238,10 +534,19 @@ def write_citing_bibtex(
     :param token: ADSABS API key.
     :param bibcodes: Bibcode(s) for which the citing papers have to be found.
     :param path: File where the file should be written.
+    :param cache_ttl_days: For how many days cached ADS responses are valid.
 
     """
 
-    bibtex = expand_journal_abbreviations(get_citing_bibtex(token, bibcodes))
+    bibtex = expand_journal_abbreviations(
+        get_citing_bibtex(token, bibcodes, cache_ttl_days=cache_ttl_days)
+    )
 
-    with open(path, "w") as file_:
-        file_.write(bibtex)
+    # We encode once and write the raw bytes to a temporary file, then publish
+    # it with an atomic rename: the text layer does not have to re-encode in
+    # chunks, and Sphinx can never pick up a half-written bibtex file if the
+    # build is interrupted
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file_:
+        file_.write(bibtex.encode("utf-8"))
+    os.replace(tmp_path, path)
@@ -16,7 +16,10 @@
 # this program; if not, see <https://www.gnu.org/licenses/>.
 
 import os
+import time
 
+import citations
+import pytest
 from citations import core
 
 
@@ -30,6 +33,124 @@ def test_expand_journal_abbreviations():
     # Missing abbreviation
     assert core.expand_journal_abbreviations("{\\lol}") == "{lol}"
 
+    # Macro embedded in a larger entry
+    expanded = core.expand_journal_abbreviations("journal = {\\mnras},")
+    assert expanded == "journal = {MNRAS},"
+
+    # Accented characters are not journal macros and must survive untouched
+    assert core.expand_journal_abbreviations('{\\"o}') == '{\\"o}'
+
+    # Unterminated brace
+    assert core.expand_journal_abbreviations("trailing {\\") == "trailing {\\"
+
+    # No macros at all
+    assert core.expand_journal_abbreviations("nothing here") == "nothing here"
+
+
+def test_make_adapter_retries_post():
+    retry = core._make_adapter(5).max_retries
+
+    # The export endpoint is queried with POST, so transient failures there
+    # have to be retried too, not only the ones on idempotent verbs
+    assert retry.is_retry("POST", 503)
+    assert retry.is_retry("POST", 429)
+    assert retry.is_retry("GET", 503)
+
+
+def test_cached_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "_CACHE_DIR", str(tmp_path))
+
+    calls = []
+
+    @core._cached_on_disk("test-set")
+    def fetch_set(token, bibcodes):
+        calls.append(bibcodes)
+        return {"result1", "result2"}
+
+    # Miss, then hit (sets have to round-trip through JSON)
+    assert fetch_set("token", ["b", "a"]) == {"result1", "result2"}
+    assert fetch_set("token", ["b", "a"]) == {"result1", "result2"}
+    assert len(calls) == 1
+
+    # Reordered and duplicated bibcodes map onto the same cache entry
+    assert fetch_set("token", ("a", "b", "b")) == {"result1", "result2"}
+    assert len(calls) == 1
+
+    # A different token is a different entry
+    fetch_set("other_token", ["b", "a"])
+    assert len(calls) == 2
+
+    # Strings round-trip unchanged
+    @core._cached_on_disk("test-str")
+    def fetch_str(token, bibcodes):
+        calls.append(bibcodes)
+        return "a bibtex"
+
+    assert fetch_str("token", "bibcode") == "a bibtex"
+    assert fetch_str("token", "bibcode") == "a bibtex"
+    assert len(calls) == 3
+
+    # Entries older than the time-to-live are refetched
+    old = time.time() - 8 * 86400
+    for cache_file in tmp_path.glob("*.json"):
+        os.utime(cache_file, (old, old))
+    fetch_set("token", ["a", "b"])
+    assert len(calls) == 4
+
+    # A time-to-live of 0 always refetches
+    fetch_set("token", ["a", "b"], cache_ttl_days=0)
+    assert len(calls) == 5
+
+
+def test_produce_bibtex_gate(tmp_path, monkeypatch):
+    written = []
+
+    def fake_write(token, bibcodes, path, cache_ttl_days=7):
+        written.append(cache_ttl_days)
+        with open(path, "w") as file_:
+            file_.write("bibtex")
+
+    monkeypatch.setattr(citations, "write_citing_bibtex", fake_write)
+
+    bibtex_file = str(tmp_path / "citations.bib")
+    config = {
+        "citations_ads_token": "token",
+        "citations_bibcode_list": ["b", "a"],
+        "citations_bibtex_file": bibtex_file,
+        "citations_cache_ttl_days": 7,
+        "citations_max_retries": 5,
+        "citations_force_refresh": False,
+    }
+
+    citations.produce_bibtex(None, config)
+    assert len(written) == 1
+
+    # Unchanged configuration with a fresh fingerprint: skipped
+    citations.produce_bibtex(None, config)
+    assert len(written) == 1
+
+    # Changed bibcode list: refetched
+    config["citations_bibcode_list"] = ["a", "c"]
+    citations.produce_bibtex(None, config)
+    assert len(written) == 2
+
+    # Fingerprint older than the time-to-live: refetched
+    old = time.time() - 8 * 86400
+    os.utime(f"{bibtex_file}.hash", (old, old))
+    citations.produce_bibtex(None, config)
+    assert len(written) == 3
+
+    # force_refresh bypasses the gate and disables the on-disk cache
+    config["citations_force_refresh"] = True
+    citations.produce_bibtex(None, config)
+    assert len(written) == 4
+    assert written[-1] == 0
+
+    # A missing token is an error
+    config["citations_ads_token"] = None
+    with pytest.raises(RuntimeError):
+        citations.produce_bibtex(None, config)
+
 
 def test_write_citing_bibtex(tmp_path):
     token = os.environ["ADS_API"]